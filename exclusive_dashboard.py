@@ -1,7 +1,19 @@
 # exclusive_dashboard.py
-import sys
-import subprocess
+import io
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import functools
+import threading
+import importlib.util
+import xml.etree.ElementTree as ET
+from datetime import date
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import streamlit as st
 
@@ -9,12 +21,28 @@ import streamlit as st
 st.set_page_config(page_title="Exclusive Report with Aging — Dashboard", layout="wide")
 BASE = Path(__file__).parent
 DATA_DIR = BASE / "data"
-(DATA_DIR / "easyhealth").mkdir(parents=True, exist_ok=True)
-(DATA_DIR / "excellent").mkdir(parents=True, exist_ok=True)
 
 # --------------------------- Generator config ---------------------
 GENERATOR = BASE / "exclusive_report_with_aging_final.py"
 
+try:
+    import python_calamine  # Rust-backed reader, much faster than openpyxl
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+# Report schema: repeated labels are read as category (each distinct value stored once).
+# Amounts stay float64 -- float32 only carries ~7 significant digits, not enough for totals in cents.
+REPORT_DTYPES = {
+    "Insurance": "category", "InsGroup": "category", "InsPlan": "category",
+    "DepName": "category", "DocName": "category",
+    "Clinician": "category", "OrderingClinician": "category",
+    "Status": "category", "ActivityStatus": "category", "AgingBucket": "category",
+}
+KPI_COLS = ["Net Amount", "Paid", "Balance", "Rejected", "Accepted"]
+# The totals tab only ever shows these; other columns in that sheet are not parsed
+TOTALS_COLS = ("Insurance", *KPI_COLS)
+
 CENTERS = {
     "easyhealth": {
         "name": "Easy Health Medical Clinic (MF8031)",
@@ -31,65 +59,347 @@ CENTERS = {
 }
 
 # --------------------------- Helpers ------------------------------
-def mtime_token(p: Path) -> float:
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_generator(digest: str):
+    """Import the generator script from GENERATOR, once per version of the file."""
+    spec = importlib.util.spec_from_file_location("exclusive_report_with_aging_final", GENERATOR)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def report_cache_key(src_path: Path) -> str:
+    # Aging buckets are relative to today, so a generated report is only reusable on the same day
+    return f"{hash_token(src_path)}-{hash_token(GENERATOR)[:8]}-{date.today():%Y%m%d}"
+
+def tmp_path(p: Path) -> Path:
+    # Per process and thread, so concurrent writers (sessions, the warm-up thread) never share one
+    return p.with_name(f"{p.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+
+def link_or_copy(src: Path, dst: Path):
+    """Atomically make dst a hard link to src (no data copied); copy instead across filesystems.
+
+    Report files are only ever replaced by rename, never rewritten in place, so sharing an
+    inode between data/<center>/report.xlsx and its .cache/ entry is safe.
+    """
+    if dst.exists() and os.path.samefile(src, dst):
+        return
+    tmp = tmp_path(dst)
+    tmp.unlink(missing_ok=True)
     try:
-        return p.stat().st_mtime
-    except FileNotFoundError:
-        return 0.0
-
-def _run(cmd):
-    res = subprocess.run(cmd, capture_output=True, text=True)
-    if res.returncode != 0:
-        raise RuntimeError(
-            "Command failed:\n" + " ".join(cmd)
-            + "\n\nSTDOUT:\n" + (res.stdout or "(empty)")
-            + "\n\nSTDERR:\n" + (res.stderr or "(empty)")
-        )
-    return res
-
-def rebuild_report(src_path: Path, out_path: Path) -> str:
-    py = sys.executable
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+def rebuild_report(src_path: Path, out_path: Path, generator, log=None) -> str:
+    """Regenerate out_path from src_path; each output line also goes to log as it is produced.
+
+    Calls no Streamlit API (the caller resolves the generator module), so it can run on a
+    worker thread.
+    """
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    src, out = str(src_path), str(out_path)
-    try:
-        res = _run([py, str(GENERATOR), "--out", out, src])
-        return res.stdout or "OK"
-    except Exception:
-        res = _run([py, str(GENERATOR), src, "--out", out])
-        return res.stdout or "OK"
-
-def _pick_sheet(sheet_names, wants):
-    lower = [s.lower() for s in sheet_names]
-    for i, s in enumerate(lower):
-        if all(w in s for w in wants):
-            return sheet_names[i]
-    for i, s in enumerate(lower):
-        if any(w in s for w in wants):
-            return sheet_names[i]
-    return None
-
-def autodetect_sheets(xls: pd.ExcelFile):
-    names = xls.sheet_names
-    totals  = _pick_sheet(names, ["total"]) or _pick_sheet(names, ["insurance"])
-    summary = _pick_sheet(names, ["aging", "summary"]) or _pick_sheet(names, ["summary"])
-    detail  = _pick_sheet(names, ["aging", "detail"])  or _pick_sheet(names, ["detail"])
+    cached = CACHE_DIR / f"{report_cache_key(src_path)}.xlsx"
+    if cached.exists():
+        link_or_copy(cached, out_path)
+        out_text = "Source unchanged since the last rebuild today — reused the generated report.\n"
+    else:
+        # Build into a side file, then rename over the report: a failed run leaves the old report
+        # intact, and the generator never writes through a hard link shared with the cache.
+        # Per-writer name, so two sessions rebuilding the same center never share (or delete) one file.
+        building = tmp_path(out_path).with_suffix(".xlsx")
+        lines = []
+        def on_line(msg):
+            # The generator only knows the side file; show the admin the report it becomes
+            line = msg.replace(str(building), str(out_path)) + "\n"
+            lines.append(line)
+            if log is not None:
+                log(line)
+        # In-process call: no interpreter start-up or pandas re-import per rebuild
+        try:
+            generator.build_report(str(src_path), str(building), log=on_line, cache_dir=str(CACHE_DIR))
+            os.replace(building, out_path)
+        except Exception as e:
+            raise RuntimeError(
+                f"Report generation failed: {e}\n\nOUTPUT:\n" + ("".join(lines) or "(empty)")
+            ) from e
+        finally:
+            building.unlink(missing_ok=True)  # no-op once renamed; removes any partial file otherwise
+        out_text = "".join(lines)
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        today = cached.stem.rsplit("-", 1)[-1]
+        for old in CACHE_DIR.glob("*.xlsx"):
+            if old.stem.rsplit("-", 1)[-1] != today:  # earlier days can never be hit again
+                old.unlink(missing_ok=True)
+        link_or_copy(out_path, cached)
+    # Warm the Parquet cache so the first view after a rebuild skips the XLSX parse
+    warm_cache(out_path)
+    return out_text or "OK"
+
+@st.cache_resource(show_spinner=False)
+def rebuild_registry() -> dict:
+    """The rebuild job per report path, shared by every session and rerun, with its lock."""
+    return {"lock": threading.Lock(), "jobs": {}}
+
+def start_rebuild(src_path: Path, out_path: Path) -> dict:
+    """Run rebuild_report on a worker thread, or return the job already running for out_path.
+
+    The job's "lines" list grows as output is produced, and "result" or "error" is set before
+    the thread exits. Streamlit may abort the script thread at any widget call (a rerun or stop),
+    so the build itself never runs there: an interrupted page leaves it unaffected.
+    """
+    reg = rebuild_registry()
+    with reg["lock"]:
+        job = reg["jobs"].get(str(out_path))
+        if job is not None and job["thread"].is_alive():
+            return job
+        job = {"lines": [], "result": None, "error": None}
+        generator = load_generator(hash_token(GENERATOR))  # st-cached, so resolved on the script thread
+        def run():
+            try:
+                job["result"] = rebuild_report(src_path, out_path, generator, log=job["lines"].append)
+            except Exception as e:
+                job["error"] = e
+        job["thread"] = threading.Thread(target=run, name="report-rebuild", daemon=True)
+        job["thread"].start()
+        reg["jobs"][str(out_path)] = job
+    return job
+
+def running_rebuild(out_path: Path):
+    """The job rebuilding out_path right now, or None."""
+    job = rebuild_registry()["jobs"].get(str(out_path))
+    return job if job is not None and job["thread"].is_alive() else None
+
+def show_rebuild(job: dict):
+    """Follow a rebuild job in an st.status box until it finishes."""
+    with st.status("Rebuilding report…", expanded=True) as status:
+        # A list rather than a queue: any number of pages (reruns, other admins) can follow one job
+        log_box, shown = st.empty(), 0
+        while True:
+            done = not job["thread"].is_alive()  # checked first, so the redraw below has every line
+            if len(job["lines"]) > shown:
+                shown = len(job["lines"])
+                log_box.code("".join(job["lines"][:shown]), language="bash")
+            if done:
+                break
+            time.sleep(0.25)
+        if job["error"] is None:
+            log_box.code(job["result"], language="bash")
+            status.update(label="Report rebuilt successfully.", state="complete")
+        else:
+            status.update(label="Rebuild failed.", state="error")
+            st.error(str(job["error"]))
+
+@functools.lru_cache(maxsize=None)
+def _sheet_patterns(wants: tuple):
+    # (all keywords, any keyword) as case-insensitive regexes, compiled once per keyword set
+    words = [re.escape(w) for w in wants]
+    return (re.compile("".join(f"(?=.*{w})" for w in words), re.I),
+            re.compile("|".join(words), re.I))
+
+def _pick_sheet(sheet_names, wants: tuple):
+    # Single pass: the first name with every keyword wins, else the first with any of them
+    match_all, match_any = _sheet_patterns(wants)
+    first_any = None
+    for n in sheet_names:
+        if match_all.match(n):
+            return n
+        if first_any is None and match_any.search(n):
+            first_any = n
+    return first_any
+
+def _sheet_names(path) -> list:
+    """Sheet names only: reads the workbook index without building a pandas ExcelFile."""
+    if EXCEL_ENGINE == "calamine":
+        with python_calamine.CalamineWorkbook.from_path(str(path)) as wb:
+            return wb.sheet_names
+    # Without calamine, read the <sheet> list from the workbook part rather than loading it in openpyxl
+    with zipfile.ZipFile(path) as z, z.open("xl/workbook.xml") as f:
+        return [el.get("name") for el in ET.parse(f).iter() if el.tag.rsplit("}", 1)[-1] == "sheet"]
+
+def autodetect_sheets(names: list):
+    totals  = _pick_sheet(names, ("total",)) or _pick_sheet(names, ("insurance",))
+    summary = _pick_sheet(names, ("aging", "summary")) or _pick_sheet(names, ("summary",))
+    detail  = _pick_sheet(names, ("aging", "detail"))  or _pick_sheet(names, ("detail",))
     if totals is None and names: totals = names[0]
     if summary is None and len(names) > 1: summary = names[1]
     if detail is None and len(names) > 2: detail = names[2] if len(names) > 2 else names[-1]
     return totals, summary, detail
 
-@st.cache_data(show_spinner=True)
-def load_report_fast(path: str, _token: float):
-    xls = pd.ExcelFile(path)
-    totals_name, summary_name, detail_name = autodetect_sheets(xls)
-    totals  = xls.parse(totals_name)
-    summary = xls.parse(summary_name)
-    return totals, summary, totals_name, summary_name, detail_name
+@st.cache_resource(show_spinner=False, max_entries=4)
+def open_xls(path: str, digest: str) -> pd.ExcelFile:
+    # Shared open workbook: sheet parses after the first skip the zip open and shared-strings load.
+    # Parsed from an in-memory copy, so no OS file handle is held: the report can be replaced or
+    # deleted under it, and an evicted entry needs no close() that could pull it from another session.
+    return pd.ExcelFile(io.BytesIO(Path(path).read_bytes()), engine=EXCEL_ENGINE)
+
+# --------------------------- Parquet cache ------------------------
+# Stored content-addressed: .cache/<digest>.<sheet>[.cols-<hash>].parquet for each parsed sheet,
+# plus .cache/<digest>.sheets.json with the workbook's sheet names.
+CACHE_DIR = BASE / ".cache"
+CACHE_MAX_BYTES = 200 * 1024 * 1024  # oldest entries are evicted past this size
+
+@functools.lru_cache(maxsize=32)
+def _digest(path: str, mtime_ns: int, size: int) -> str:
+    # SHA-1 is only a cache key here; OpenSSL's hardware-accelerated SHA-1 is about twice
+    # blake2b's throughput, and file_digest streams through one reused buffer.
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha1").hexdigest()
+
+def hash_token(p: Path) -> str:
+    """Content digest of a file ("" if it does not exist).
+
+    Memoized on (path, mtime, size), so a rerun only pays for a stat() unless the file changed.
+    """
+    try:
+        info = Path(p).stat()
+        return _digest(str(p), info.st_mtime_ns, info.st_size)
+    except FileNotFoundError:
+        return ""
+
+def cache_path(digest: str, sheet_name: str, usecols: tuple = None) -> Path:
+    # A column-pruned parse gets its own file, so it is never served to a caller wanting every column
+    cols = "" if usecols is None else ".cols-" + hashlib.sha1("\0".join(usecols).encode()).hexdigest()[:8]
+    return CACHE_DIR / f"{digest}.{sheet_name}{cols}.parquet"
 
-@st.cache_data(show_spinner=True)
-def load_detail_sheet(path: str, detail_sheet: str, _token: float):
-    xls = pd.ExcelFile(path)
-    return xls.parse(detail_sheet)
+def names_path(digest: str) -> Path:
+    return CACHE_DIR / f"{digest}.sheets.json"
+
+def remove_cached(digest: str):
+    if digest:
+        for p in CACHE_DIR.glob(f"{digest}.*"):
+            p.unlink(missing_ok=True)
+
+# Cache files are written to a private temp file and renamed into place, so a concurrent
+# reader sees either no file or a complete one.
+def write_names(names: list, p: Path):
+    tmp = tmp_path(p)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(list(names)), encoding="utf-8")
+        os.replace(tmp, p)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+
+def write_cached(df: pd.DataFrame, p: Path):
+    # Best effort: if the write fails the next load simply parses the XLSX again
+    tmp = tmp_path(p)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(tmp, compression="zstd", index=False)
+        os.replace(tmp, p)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+    prune_cache()
+
+def prune_cache(max_bytes: int = CACHE_MAX_BYTES):
+    """Delete the least recently written cache files until the directory fits in max_bytes."""
+    try:
+        files = [(e.path, e.stat()) for e in os.scandir(CACHE_DIR) if e.is_file()]
+    except OSError:
+        return
+    total = sum(info.st_size for _, info in files)
+    for path, info in sorted(files, key=lambda f: f[1].st_mtime_ns):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+            total -= info.st_size
+        except OSError:
+            pass
+
+def shrink_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Lossless downcasts: integers to the narrowest int type, repetitive text to category."""
+    for c in df.select_dtypes("integer").columns:
+        df[c] = pd.to_numeric(df[c], downcast="integer")
+    for c in df.select_dtypes(["object", "string"]).columns:
+        col = df[c]
+        if pd.api.types.infer_dtype(col, skipna=True) == "string" and col.nunique() < 0.5 * len(col):
+            df[c] = col.astype("category")
+    return df
+
+def read_sheet(xls: pd.ExcelFile, sheet_name: str, usecols=None) -> pd.DataFrame:
+    # Callable usecols: columns missing from the sheet are skipped instead of raising
+    cols = None if usecols is None else (lambda c: c in usecols)
+    return shrink_dtypes(xls.parse(sheet_name, usecols=cols, dtype=REPORT_DTYPES))
+
+def _warm_paths(digest: str, names: list) -> list:
+    """Cache files warm_cache writes for a workbook with these sheet names."""
+    totals_name, *others = autodetect_sheets(names)
+    paths = [cache_path(digest, totals_name, TOTALS_COLS)] if totals_name is not None else []
+    return paths + [cache_path(digest, n) for n in dict.fromkeys(others) if n is not None and n != totals_name]
+
+def warm_cache(path: Path):
+    """Parse the report's sheets not yet in the Parquet cache, in one pass over a private workbook.
+
+    Uses no Streamlit-cached function, so the warm-up thread (which has no script context) can call it.
+    """
+    digest = hash_token(path)
+    p = names_path(digest)
+    if p.exists() and all(c.exists() for c in _warm_paths(digest, json.loads(p.read_text(encoding="utf-8")))):
+        return  # fully cached: skip opening the workbook at all
+    with pd.ExcelFile(path, engine=EXCEL_ENGINE) as xls:
+        write_names(xls.sheet_names, p)
+        totals_name, *others = autodetect_sheets(xls.sheet_names)
+        if totals_name is not None:
+            tp = cache_path(digest, totals_name, TOTALS_COLS)
+            if not tp.exists():
+                write_cached(read_sheet(xls, totals_name, TOTALS_COLS), tp)
+        rest = [n for n in dict.fromkeys(others)
+                if n is not None and n != totals_name and not cache_path(digest, n).exists()]
+        if rest:
+            for name, df in xls.parse(sheet_name=rest, dtype=REPORT_DTYPES).items():
+                write_cached(shrink_dtypes(df), cache_path(digest, name))
+
+@st.cache_data(show_spinner=False)
+def report_sheet_list(path: str, digest: str) -> list:
+    """All sheet names; the workbook is probed at most once per digest, then read from the cache."""
+    p = names_path(digest)
+    if p.exists():
+        return json.loads(p.read_text(encoding="utf-8"))
+    names = _sheet_names(path)
+    write_names(names, p)
+    return names
+
+def report_sheet_names(path: str, digest: str):
+    # (totals, summary, detail) from the same list the error path shows, so both share one probe
+    return autodetect_sheets(report_sheet_list(path, digest))
+
+# cache_resource hands back the same DataFrame on every hit (no pickle round-trip like
+# cache_data), so callers must treat it as read-only.
+@st.cache_resource(show_spinner=True, max_entries=12)
+def load_sheet(path: str, sheet_name: str, digest: str, usecols: tuple = None) -> pd.DataFrame:
+    p = cache_path(digest, sheet_name, usecols)
+    if p.exists():
+        return pd.read_parquet(p)
+    df = read_sheet(open_xls(path, digest), sheet_name, usecols)
+    write_cached(df, p)
+    return df
+
+def _warm_centers():
+    # Runs on a plain thread, so it fills only the on-disk cache (warm_cache touches no st caches)
+    for cfg in CENTERS.values():
+        out_path = cfg["folder"] / cfg["out_name"]
+        digest = hash_token(out_path)
+        if not digest:
+            continue
+        try:
+            warm_cache(out_path)
+        except Exception:
+            pass  # the viewer reports load errors when the center is opened
+
+@st.cache_resource(show_spinner=False)
+def ensure_dirs() -> bool:
+    """Create every center's data folder once per server process, not on each rerun."""
+    for cfg in CENTERS.values():
+        cfg["folder"].mkdir(parents=True, exist_ok=True)
+    return True
+
+@st.cache_resource(show_spinner=False)
+def start_warmup() -> threading.Thread:
+    """Preload every center's existing report once per server process, off the script thread."""
+    t = threading.Thread(target=_warm_centers, name="report-warmup", daemon=True)
+    t.start()
+    return t
 
 def trim_empty_rows(df: pd.DataFrame) -> pd.DataFrame:
     if df is None or df.empty:
@@ -97,41 +407,51 @@ def trim_empty_rows(df: pd.DataFrame) -> pd.DataFrame:
     df2 = df.dropna(how="all")
     if df2.empty:
         return df2
-    blank_rows = df2.fillna("").astype(str).apply(lambda row: "".join(row).strip() == "", axis=1)
-    return df2.loc[~blank_rows]
+    # Column-wise: a cell is blank if missing or whitespace-only text; only text columns can be the latter
+    blank = df2.isna()
+    for c in df2.select_dtypes(["object", "string", "category"]).columns:
+        blank[c] |= df2[c].astype(str).str.strip().eq("")
+    return df2.loc[~blank.all(axis=1)]
+
+def grand_total_mask(labels: pd.Series) -> pd.Series:
+    """Rows labelled "Grand Total" (exact match, ignoring case and surrounding spaces)."""
+    if isinstance(labels.dtype, pd.CategoricalDtype):
+        # Test each distinct label once, then a hash lookup per row
+        hits = [c for c in labels.cat.categories if str(c).strip().lower() == "grand total"]
+        return labels.isin(hits)
+    return labels.astype(str).str.strip().str.lower().eq("grand total")
 
 def show_kpis_smart(totals: pd.DataFrame):
-    ins_col = "Insurance" if "Insurance" in totals.columns else None
-    gt = None
-    if ins_col:
-        mask_gt = totals[ins_col].astype(str).str.contains("grand total", case=False, na=False)
+    if totals is None or totals.empty:
+        return  # nothing to summarise; skip the five metric widgets
+    vals = None
+    if "Insurance" in totals.columns:
+        mask_gt = grand_total_mask(totals["Insurance"])
         if mask_gt.any():
-            gt = totals.loc[mask_gt].iloc[-1]
-    if gt is not None:
-        net = float(gt.get("Net Amount", 0)); paid = float(gt.get("Paid", 0))
-        bal = float(gt.get("Balance", 0)); rej = float(gt.get("Rejected", 0))
-        acc = float(gt.get("Accepted", 0))
-    else:
-        def v(c): return float(totals[c].sum()) if c in totals.columns else 0.0
-        net, paid, bal, rej, acc = v("Net Amount"), v("Paid"), v("Balance"), v("Rejected"), v("Accepted")
-    c1, c2, c3, c4, c5 = st.columns(5)
-    c1.metric("Net Amount", f"{net:,.2f}")
-    c2.metric("Paid", f"{paid:,.2f}")
-    c3.metric("Balance", f"{bal:,.2f}")
-    c4.metric("Rejected", f"{rej:,.2f}")
-    c5.metric("Accepted", f"{acc:,.2f}")
-
-def full_height(df, row_px: int = 45, header_px: int = 70, padding_px: int = 150) -> int:
+            vals = totals.loc[mask_gt].iloc[-1]
+    if vals is None:
+        # One reduction over the KPI columns present; missing ones read as 0 below
+        vals = totals[[c for c in KPI_COLS if c in totals.columns]].sum(numeric_only=True)
+    nums = vals.reindex(KPI_COLS, fill_value=0).to_numpy(dtype=float)
+    for col, kpi, v in zip(st.columns(len(KPI_COLS)), KPI_COLS, nums):
+        col.metric(kpi, f"{v:,.2f}")
+
+def full_height(df, row_px: int = 45, header_px: int = 70, padding_px: int = 150, max_px: int = None) -> int:
     n = 0 if df is None else len(df)
-    return header_px + (n * row_px) + padding_px
+    h = header_px + (n * row_px) + padding_px
+    return h if max_px is None else min(h, max_px)
+
+DETAIL_PAGE_ROWS = 1000
+DETAIL_MAX_HEIGHT_PX = 600
+STYLED_MAX_ROWS = 200  # above this the per-cell Styler CSS outweighs the table itself
 
 # --------------------------- Styling ---------------------------
-def style_grid(df: pd.DataFrame):
+def style_grid(df: pd.DataFrame, start: int = 1):
     """
     Styled DataFrame with:
     - Blue header row
     - White index column (no color)
-    - Index starts from 1
+    - Index starts from `start` (1 unless showing a later page)
     - Borders + Grand Total highlight
     """
     if not isinstance(df, pd.DataFrame):
@@ -139,8 +459,8 @@ def style_grid(df: pd.DataFrame):
     if df.shape[1] == 0:
         return df.style
 
-    # ✅ Reset index to start from 1
-    df.index = range(1, len(df) + 1)
+    # ✅ Index starts from 1 (relabelled copy: df may be a shared cached frame)
+    df = df.set_axis(range(start, start + len(df)))
 
     first_col = df.columns[0]
     num_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
@@ -180,24 +500,34 @@ def style_grid(df: pd.DataFrame):
 
     # ✅ Highlight "Grand Total"
     try:
-        mask_gt = df[first_col].astype(str).str.contains("grand total", case=False, na=False)
+        mask_gt = grand_total_mask(df[first_col])
         if mask_gt.any():
-            def highlight(row):
-                return (["font-weight:700; color:black; background-color:#FFF7E0"] * len(row)
-                        if mask_gt.iloc[row.name - 1] else [""] * len(row))
-            styler = styler.apply(highlight, axis=1)
+            # One broadcast over the whole grid instead of a Python call per row
+            css = np.where(mask_gt.to_numpy()[:, None],
+                           "font-weight:700; color:black; background-color:#FFF7E0", "")
+            css = np.broadcast_to(css, df.shape)
+            styler = styler.apply(lambda d: pd.DataFrame(css, index=d.index, columns=d.columns), axis=None)
     except Exception:
         pass
 
     return styler
 
+def render_df(df: pd.DataFrame, start: int = 1, styled: bool = True, height: int = None):
+    """Styled grid for small tables; large ones get client-side number formatting only."""
+    if styled and len(df) <= STYLED_MAX_ROWS:
+        st.dataframe(style_grid(df, start=start), use_container_width=True, height=height)
+        return
+    num_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    st.dataframe(df.set_axis(range(start, start + len(df))), use_container_width=True, height=height,
+                 column_config={c: st.column_config.NumberColumn(format="%,.2f") for c in num_cols})
+
+ensure_dirs()
+start_warmup()
+
 # --------------------------- Streamlit state ---------------------------
-if "is_admin" not in st.session_state:
-    st.session_state.is_admin = False
-if "center_key" not in st.session_state:
-    st.session_state.center_key = None
-if "last_center_key" not in st.session_state:
-    st.session_state.last_center_key = None
+# Initialised once per session; everything below gates off session_state only
+for key, default in (("is_admin", False), ("center_key", None)):
+    st.session_state.setdefault(key, default)
 
 left, right = st.columns([5, 1])
 with left:
@@ -205,11 +535,6 @@ with left:
 with right:
     st.session_state.is_admin = st.toggle("Admin mode", value=st.session_state.is_admin)
 
-if st.session_state.center_key != st.session_state.last_center_key:
-    load_report_fast.clear()
-    load_detail_sheet.clear()
-    st.session_state.last_center_key = st.session_state.center_key
-
 st.caption(f"Mode: **{'admin' if st.session_state.is_admin else 'view'}** · Center: **{st.session_state.center_key or 'none'}**")
 
 ck = st.session_state.center_key
@@ -240,47 +565,66 @@ if st.session_state.is_admin:
         up = st.file_uploader("Upload .xlsx", type=["xlsx"])
         if up:
             folder.mkdir(parents=True, exist_ok=True)
-            src_path.write_bytes(up.read())
+            up.seek(0)
+            with open(src_path, "wb") as f:
+                shutil.copyfileobj(up, f, length=1024 * 1024)  # 1 MiB chunks, no full in-memory copy
             st.success(f"Saved to {src_path}")
     colA, colB, colC = st.columns(3)
+    # No cache clearing: every cached entry is keyed by the report digest, so the new file
+    # gets fresh entries and other sessions keep their handles on the old one
     if colA.button("↻ Rebuild report", use_container_width=True):
-        try:
-            msg = rebuild_report(src_path, out_path)
-            st.success("Report rebuilt successfully.")
-            if msg.strip(): st.code(msg, language="bash")
-            load_report_fast.clear(); load_detail_sheet.clear()
-        except Exception as e: st.error(str(e))
+        show_rebuild(start_rebuild(src_path, out_path))
+    elif (job := running_rebuild(out_path)) is not None:
+        # Started by an earlier, interrupted run of this page or by another admin: keep following it
+        show_rebuild(job)
     if colB.button("🗂 Show file locations", use_container_width=True):
         st.info(f"Source: {src_path}\nReport: {out_path}\nScript: {GENERATOR}")
     if colC.button("🗑 Reset (delete) this center's report", use_container_width=True):
         try:
+            remove_cached(hash_token(out_path))
             if out_path.exists(): out_path.unlink()
             st.success("Report deleted.")
-            load_report_fast.clear(); load_detail_sheet.clear()
         except Exception as e: st.error(str(e))
 
-token = mtime_token(out_path)
-if token == 0.0:
+# One stat per run: the digest doubles as the existence check ("" when the report is missing)
+digest = hash_token(out_path)
+if not digest:
     msg = "Report not found for this center."
     if st.session_state.is_admin: msg += " (Upload source and click Rebuild.)"
     st.warning(msg)
 else:
     try:
-        totals, summary, s_tot, s_sum, s_det = load_report_fast(str(out_path), token)
+        s_tot, s_sum, s_det = report_sheet_names(str(out_path), digest)
+        # Totals feed the KPIs so they always load; the other sheets are parsed only when their tab is open
+        totals = load_sheet(str(out_path), s_tot, digest, TOTALS_COLS)
         show_kpis_smart(totals)
-        t1, t2, t3 = st.tabs([f"{s_tot}", f"{s_sum}", f"{s_det}"])
-        with t1:
-            df1 = trim_empty_rows(totals)
-            st.dataframe(style_grid(df1), use_container_width=True, height=full_height(df1))
-        with t2:
-            df2 = trim_empty_rows(summary)
-            st.dataframe(style_grid(df2), use_container_width=True, height=full_height(df2))
-        with t3:
-            df3 = load_detail_sheet(str(out_path), s_det, token)
-            st.dataframe(style_grid(df3), use_container_width=True, height=full_height(df3))
+        t1, t2, t3 = st.tabs([f"{s_tot}", f"{s_sum}", f"{s_det}"], key="report_tab", on_change="rerun")
+        if t1.open:
+            with t1:
+                df1 = trim_empty_rows(totals)
+                render_df(df1, height=full_height(df1))
+        if t2.open:
+            with t2:
+                df2 = trim_empty_rows(load_sheet(str(out_path), s_sum, digest))
+                render_df(df2, height=full_height(df2))
+        if t3.open:
+            with t3:
+                df3, start = load_sheet(str(out_path), s_det, digest), 0
+                if len(df3) > DETAIL_PAGE_ROWS:
+                    # Only the current page is sent to the browser
+                    pages = (len(df3) - 1) // DETAIL_PAGE_ROWS + 1
+                    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages,
+                                           value=1, step=1, key=f"detail_page_{digest}")
+                    start = (page - 1) * DETAIL_PAGE_ROWS
+                    st.caption(f"Rows {start + 1:,}–{min(start + DETAIL_PAGE_ROWS, len(df3)):,} of {len(df3):,}")
+                    df3 = df3.iloc[start:start + DETAIL_PAGE_ROWS]
+                # Capped height: the grid scrolls (and only draws visible rows) instead of growing to fit.
+                # No Styler here: number formatting is done client-side via column_config.
+                render_df(df3, start=start + 1, styled=False,
+                          height=full_height(df3, max_px=DETAIL_MAX_HEIGHT_PX))
     except Exception as e:
         try:
-            names = pd.ExcelFile(str(out_path)).sheet_names
+            names = report_sheet_list(str(out_path), digest)
         except Exception: names = []
         st.error(f"{e}\n\nAvailable sheets: {', '.join(names) if names else '(none)'}")
 
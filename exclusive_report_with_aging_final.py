@@ -1,23 +1,40 @@
 #!/usr/bin/env python3
 
-import sys, os, hashlib, argparse
+import os, hashlib, argparse, threading
 from datetime import datetime
+import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill, Font, Alignment
 
 # =========================================
 # Toggle: write the raw "Exclusive_Report" sheet?
 # =========================================
 WRITE_EXCLUSIVE_SHEET = False  # <-- leave False to skip that sheet
 
+try:
+    import python_calamine  # noqa: F401  (Rust-backed reader, several times faster than openpyxl)
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+# Bump whenever load_data's parsing changes, so parsed-input caches from older code are not reused
+PARSE_VERSION = 1
+
+# Aging buckets (days since reference date), shared by add_aging and the summary pivot
+AGING_BINS   = [-1, 30, 45, 60, 90, float("inf")]
+AGING_LABELS = ["0–30 Days", "31–45 Days", "46–60 Days", "61–90 Days", ">90 Days"]
+
+# Remittance columns that add up to "Paid"
+PAID_COLS = [
+    "actRemitInsShare", "actResub1RemitInsShare",
+    "actResub2RemitInsShare", "actResub3RemitInsShare",
+    "TKBKAmountAct",
+]
+
 # -------------------- helpers --------------------
 def sha1_short(path: str) -> str:
-    h = hashlib.sha1()
+    # file_digest streams through one reused buffer inside hashlib (OpenSSL SHA-1, SHA-NI where available)
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()[:12]
+        return hashlib.file_digest(f, "sha1").hexdigest()[:12]
 
 def parse_args():
     p = argparse.ArgumentParser(
@@ -26,72 +43,83 @@ def parse_args():
     p.add_argument("input_xlsx", help="Path to source Excel (.xlsx)")
     p.add_argument("--out", dest="out_xlsx", required=True,
                    help="Path to write the output workbook (.xlsx)")
-    args = p.parse_args()
+    return p.parse_args()
 
-    if not os.path.exists(args.input_xlsx):
-        raise FileNotFoundError(f"❌ File not found: {args.input_xlsx}")
-    if not args.input_xlsx.lower().endswith(".xlsx"):
+def check_paths(input_xlsx: str, out_xlsx: str):
+    if not os.path.exists(input_xlsx):
+        raise FileNotFoundError(f"❌ File not found: {input_xlsx}")
+    if not input_xlsx.lower().endswith(".xlsx"):
         raise ValueError("❌ Input must be .xlsx")
-    out_dir = os.path.dirname(os.path.abspath(args.out_xlsx)) or "."
+    out_dir = os.path.dirname(os.path.abspath(out_xlsx)) or "."
     os.makedirs(out_dir, exist_ok=True)
-    return args
 
 # -------------------- ETL parts --------------------
-def load_data(input_file: str) -> pd.DataFrame:
-    df = pd.read_excel(input_file, engine="openpyxl")
+def load_data(input_file: str, cache_file: str = None) -> pd.DataFrame:
+    """Read the source sheet; with cache_file, reuse (or save) the parsed frame as Parquet."""
+    if cache_file and os.path.exists(cache_file):
+        return pd.read_parquet(cache_file)
+    df = pd.read_excel(input_file, engine=EXCEL_ENGINE)
     df.columns = df.columns.str.strip()
+    if cache_file:
+        # Written aside and renamed into place: a concurrent build never reads a partial file
+        tmp = f"{cache_file}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            df.to_parquet(tmp, compression="zstd", index=False)
+            os.replace(tmp, cache_file)
+        except Exception:  # e.g. a mixed-type column pyarrow can't store; just skip the cache
+            if os.path.exists(tmp):
+                os.remove(tmp)
     return df
 
 def ensure_numeric(df: pd.DataFrame) -> pd.DataFrame:
-    num_cols = [
-        "ActivityIns",
-        "actRemitInsShare", "actResub1RemitInsShare",
-        "actResub2RemitInsShare", "actResub3RemitInsShare",
-        "TKBKAmountAct",
-    ]
-    for c in num_cols:
+    for c in ["ActivityIns", *PAID_COLS]:
         if c not in df.columns:
             df[c] = 0
         df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
     return df
 
 def compute_measures(df: pd.DataFrame) -> pd.DataFrame:
-    df["Paid"] = df[
-        ["actRemitInsShare", "actResub1RemitInsShare",
-         "actResub2RemitInsShare", "actResub3RemitInsShare",
-         "TKBKAmountAct"]
-    ].sum(axis=1)
-
-    df["Rejection"], df["Accepted"], df["Balance"] = 0.0, 0.0, 0.0
+    # Accumulate into one buffer instead of materializing a 5-column block for sum(axis=1);
+    # the buffer takes the columns' common dtype, so integer-only remittances stay integers
+    cols = [df[c].to_numpy() for c in PAID_COLS]
+    paid = np.zeros(len(df), dtype=np.result_type(*cols))
+    for col in cols:
+        paid += col
+    df["Paid"] = paid
 
     if "ActivityStatus" in df.columns and "DenialCode" in df.columns:
-        lower_status = df["ActivityStatus"].astype(str).str.lower()
-        mask_paid = df["Paid"] > 0
-        mask_reject = (df["Paid"] == 0) & (lower_status == "rejected") & (df["DenialCode"].notna())
-        mask_balance = (df["Paid"] == 0) & ~mask_reject
-
-        df.loc[mask_paid, "Accepted"] = df["ActivityIns"] - df["Paid"]
-        df.loc[mask_reject, "Rejection"] = df["ActivityIns"]
-        df.loc[mask_balance, "Balance"] = df["ActivityIns"]
+        ins, paid = df["ActivityIns"].to_numpy(), df["Paid"].to_numpy()
+        rejected = df["ActivityStatus"].astype(str).str.lower().eq("rejected").to_numpy()
+        mask_paid = paid > 0
+        mask_reject = (paid == 0) & rejected & df["DenialCode"].notna().to_numpy()
+        mask_balance = (paid == 0) & ~mask_reject
+
+        # Each measure built in one pass: the amount where its mask holds, else 0
+        df["Rejection"] = np.where(mask_reject, ins, 0.0)
+        df["Accepted"] = np.where(mask_paid, ins - paid, 0.0)
+        df["Balance"] = np.where(mask_balance, ins, 0.0)
+    else:
+        df["Rejection"], df["Accepted"], df["Balance"] = 0.0, 0.0, 0.0
 
     return df
 
 def add_aging(df: pd.DataFrame) -> pd.DataFrame:
-    from datetime import datetime as dt
     date_candidates = [c for c in ["SubmissionDate", "ClaimDate", "VisitDate"] if c in df.columns]
     if date_candidates:
         for c in date_candidates:
             df[c] = pd.to_datetime(df[c], errors="coerce", dayfirst=True)
-        df["RefDate"] = df[date_candidates].bfill(axis=1).iloc[:, 0]
+        # First non-null date in candidate order, coalesced column by column
+        ref = df[date_candidates[0]]
+        for c in date_candidates[1:]:
+            ref = ref.fillna(df[c])
+        df["RefDate"] = ref
     else:
         df["RefDate"] = pd.NaT
 
-    today = pd.Timestamp(dt.today().date())
+    today = pd.Timestamp(datetime.today().date())
     df["DaysDiff"] = (today - df["RefDate"]).dt.days
 
-    bins = [-1, 30, 45, 60, 90, float("inf")]
-    labels = ["0–30 Days", "31–45 Days", "46–60 Days", "61–90 Days", ">90 Days"]
-    df["AgingBucket"] = pd.cut(df["DaysDiff"], bins=bins, labels=labels)
+    df["AgingBucket"] = pd.cut(df["DaysDiff"], bins=AGING_BINS, labels=AGING_LABELS)
     return df
 
 def ensure_insurance_column(df: pd.DataFrame) -> pd.DataFrame:
@@ -103,7 +131,6 @@ def ensure_insurance_column(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 def build_balance_aging_summary(balance_df: pd.DataFrame) -> pd.DataFrame:
-    labels = ["0–30 Days", "31–45 Days", "46–60 Days", "61–90 Days", ">90 Days"]
     pivot_summary = pd.pivot_table(
         balance_df,
         index="Insurance",
@@ -112,79 +139,80 @@ def build_balance_aging_summary(balance_df: pd.DataFrame) -> pd.DataFrame:
         aggfunc="sum",
         fill_value=0,
         observed=False,
-    ).reindex(columns=labels)
+    ).reindex(columns=AGING_LABELS)
     pivot_summary["Grand Total"] = pivot_summary.sum(axis=1)
     pivot_summary.loc["Grand Total"] = pivot_summary.sum(axis=0)
     pivot_summary.reset_index(inplace=True)
     return pivot_summary
 
 def build_insurance_totals(df: pd.DataFrame) -> pd.DataFrame:
+    # Columns picked in report order up front, so the renamed result needs no reordering copy
     insurance_totals = (
-        df.groupby("Insurance", dropna=False)[["ActivityIns", "Paid", "Rejection", "Accepted", "Balance"]]
+        df.groupby("Insurance", dropna=False)[["ActivityIns", "Paid", "Balance", "Rejection", "Accepted"]]
           .sum()
           .reset_index()
+          .rename(columns={"ActivityIns": "Net Amount", "Rejection": "Rejected"})
     )
-    insurance_totals = insurance_totals.rename(columns={"ActivityIns": "Net Amount", "Rejection": "Rejected"})
-    insurance_totals = insurance_totals[["Insurance", "Net Amount", "Paid", "Balance", "Rejected", "Accepted"]]
-    total_row = {
-        "Insurance": "Grand Total",
-        "Net Amount": insurance_totals["Net Amount"].sum(),
-        "Paid": insurance_totals["Paid"].sum(),
-        "Balance": insurance_totals["Balance"].sum(),
-        "Rejected": insurance_totals["Rejected"].sum(),
-        "Accepted": insurance_totals["Accepted"].sum(),
-    }
-    insurance_totals = pd.concat([insurance_totals, pd.DataFrame([total_row])], ignore_index=True)
+    # Appended in place rather than concatenating a one-row frame; summed per column, since
+    # one frame-wide sum() would upcast integer columns to float64 in the row (and the frame)
+    totals = [insurance_totals[c].sum() for c in insurance_totals.columns[1:]]
+    insurance_totals.loc[len(insurance_totals)] = ["Grand Total", *totals]
     return insurance_totals
 
 # -------------------- styling --------------------
-HEADER_FILL = PatternFill(start_color="BDD7EE", end_color="BDD7EE", fill_type="solid")
-TOTAL_FILL  = PatternFill(start_color="FCE4D6", end_color="FCE4D6", fill_type="solid")
-
-def style_headers(ws):
-    for c in range(1, ws.max_column + 1):
-        cell = ws.cell(row=1, column=c)
-        cell.fill = HEADER_FILL
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-
-def apply_styling(output_file: str):
-    wb = load_workbook(output_file)
-    for ws in wb.worksheets:
-        style_headers(ws)
-        if ws.title == "Balance_Aging_Summary":
-            for r in range(2, ws.max_row + 1):
-                if ws.cell(row=r, column=1).value == "Grand Total":
-                    for c in range(1, ws.max_column + 1):
-                        cell = ws.cell(row=r, column=c)
-                        cell.fill = TOTAL_FILL
-                        cell.font = Font(bold=True)
-            last_col = ws.max_column
-            for r in range(1, ws.max_row + 1):
-                cell = ws.cell(row=r, column=last_col)
-                cell.fill = TOTAL_FILL
-                cell.font = Font(bold=True)
-
-        if ws.title == "Insurance_Totals":
-            for r in range(2, ws.max_row + 1):
-                if ws.cell(row=r, column=1).value == "Grand Total":
-                    for c in range(1, ws.max_column + 1):
-                        cell = ws.cell(row=r, column=c)
-                        cell.fill = TOTAL_FILL
-                        cell.font = Font(bold=True)
-    wb.save(output_file)
-
-# -------------------- main --------------------
-def main():
-    args = parse_args()
-    input_file = os.path.abspath(args.input_xlsx)
-    out_file   = os.path.abspath(args.out_xlsx)
+# xlsxwriter format properties; cells are styled as they are written, no second pass over the file
+HEADER_FMT = {"bold": True, "bg_color": "#BDD7EE", "align": "center", "valign": "vcenter"}
+TOTAL_FMT  = {"bold": True, "bg_color": "#FCE4D6"}
+
+def make_formats(wb) -> dict:
+    return {
+        "header": wb.add_format(HEADER_FMT),
+        "total": wb.add_format(TOTAL_FMT),
+        "header_total": wb.add_format({**HEADER_FMT, **TOTAL_FMT}),
+    }
 
-    print(f"📂 Using input : {input_file}")
-    print(f"📄 Output file : {out_file}")
-    print(f"🔑 Input SHA1  : {sha1_short(input_file)}")
+def write_cell(ws, row: int, col: int, value, fmt):
+    if pd.isna(value):
+        ws.write_blank(row, col, None, fmt)
+    else:
+        ws.write(row, col, value, fmt)
+
+def write_sheet(writer, df: pd.DataFrame, sheet_name: str, fmts: dict, total_row=False, total_col=False):
+    """Write df, then restyle its header (plus Grand Total row / last column when asked)."""
+    df.to_excel(writer, sheet_name=sheet_name, index=False)
+    ws = writer.sheets[sheet_name]
+    last = len(df.columns) - 1
+    for c, name in enumerate(df.columns):
+        ws.write(0, c, name, fmts["header_total"] if total_col and c == last else fmts["header"])
+    if total_row and len(df.columns):
+        for r in (df.iloc[:, 0] == "Grand Total").to_numpy().nonzero()[0]:
+            for c, value in enumerate(df.iloc[r]):
+                write_cell(ws, r + 1, c, value, fmts["total"])
+    if total_col:
+        for r, value in enumerate(df.iloc[:, last]):
+            write_cell(ws, r + 1, last, value, fmts["total"])
 
-    df = load_data(input_file)
+# -------------------- main --------------------
+def build_report(input_xlsx: str, out_xlsx: str, log=print, cache_dir: str = None):
+    """Build the report workbook; progress messages go to log (print by default).
+
+    With cache_dir, the parsed input is kept there as Parquet keyed by its SHA1, so a
+    rebuild from an unchanged source skips the Excel parse.
+    """
+    check_paths(input_xlsx, out_xlsx)
+    input_file = os.path.abspath(input_xlsx)
+    out_file   = os.path.abspath(out_xlsx)
+    input_sha1 = sha1_short(input_file)
+
+    log(f"📂 Using input : {input_file}")
+    log(f"📄 Output file : {out_file}")
+    log(f"🔑 Input SHA1  : {input_sha1}")
+
+    cache_file = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_file = os.path.join(cache_dir, f"input-{input_sha1}-{EXCEL_ENGINE}-v{PARSE_VERSION}.parquet")
+    df = load_data(input_file, cache_file)
     df = ensure_numeric(df)
     df = compute_measures(df)
     df = add_aging(df)
@@ -195,23 +223,27 @@ def main():
     insurance_totals = build_insurance_totals(df)
 
     # Write sheets (skip "Exclusive_Report" if disabled)
-    with pd.ExcelWriter(out_file, engine="openpyxl") as writer:
+    with pd.ExcelWriter(out_file, engine="xlsxwriter") as writer:
+        fmts = make_formats(writer.book)
         if WRITE_EXCLUSIVE_SHEET:
-            df.to_excel(writer, sheet_name="Exclusive_Report", index=False)
-        insurance_totals.to_excel(writer, sheet_name="Insurance_Totals", index=False)
-        pivot_summary.to_excel(writer, sheet_name="Balance_Aging_Summary", index=False)
-        balance_df.to_excel(writer, sheet_name="Balance_Aging_Detail", index=False)
+            write_sheet(writer, df, "Exclusive_Report", fmts)
+        write_sheet(writer, insurance_totals, "Insurance_Totals", fmts, total_row=True)
+        write_sheet(writer, pivot_summary, "Balance_Aging_Summary", fmts, total_row=True, total_col=True)
+        write_sheet(writer, balance_df, "Balance_Aging_Detail", fmts)
 
         meta = pd.DataFrame([{
             "InputFile": os.path.basename(input_file),
-            "InputSHA1": sha1_short(input_file),
+            "InputSHA1": input_sha1,
             "GeneratedAt": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "Exclusive_Report_Written": WRITE_EXCLUSIVE_SHEET,
         }])
-        meta.to_excel(writer, sheet_name="Meta", index=False)
+        write_sheet(writer, meta, "Meta", fmts)
+
+    log("✅ Done.")
 
-    apply_styling(out_file)
-    print("✅ Done.")
+def main():
+    args = parse_args()
+    build_report(args.input_xlsx, args.out_xlsx)
 
 if __name__ == "__main__":
     main()